@@ -0,0 +1,21 @@
+#!/bin/sh
+# Run one of the demo scripts with jemalloc preloaded. glibc's ptmalloc is
+# a known ~2x bottleneck for USD's multi-threaded allocation patterns
+# during stage construction and serialization; preloading jemalloc (or
+# tcmalloc) buys that back without touching the scripts. Falls back to the
+# plain interpreter when no jemalloc is installed.
+#
+# Usage:
+#   scripts/run.sh write_random_scene.py scenes/scene1.usda
+#   scripts/run.sh simple_composer.py a.usda b.usda out.usda
+
+JEMALLOC=$(ldconfig -p 2>/dev/null | grep -m1 libjemalloc | awk '{print $NF}')
+if [ -n "$JEMALLOC" ]; then
+    LD_PRELOAD="$JEMALLOC${LD_PRELOAD:+:$LD_PRELOAD}"
+    export LD_PRELOAD
+fi
+
+script_dir=$(dirname "$0")
+script="$1"
+shift
+exec python3 "$script_dir/$script" "$@"
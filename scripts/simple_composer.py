@@ -21,88 +21,134 @@ import logging
 
 
 import argparse
+import concurrent.futures
 from multiprocessing.util import LOGGER_NAME
 
-from pxr import Usd, Sdf
+from pxr import Usd, UsdUtils, Sdf
 
 
 LOGGER = logging.getLogger(LOGGER_NAME)
-DEBUG = True  # Set to True to enable debug output
+# Metadata keys handled by copy_attributes rather than copy_metadata
+CUSTOM_DATA_KEYS = frozenset(("comment", "documentation", "focalLength"))
+# Hoisted so the metadata loop does an exact-type check against a local name
+# instead of resolving Sdf.UnregisteredValue per key
+UNREGISTERED_VALUE = Sdf.UnregisteredValue
+# Fallback type for typeless prims, resolved once instead of per prim
+XFORM_TYPE_NAME = "Xform"
+DEBUG = False  # Set to True to enable debug output
 # Enable debug logging if needed
 if DEBUG:
     logging.basicConfig(level=logging.DEBUG)
 
 
-def copy_metadata(src_prim, dst_prim):
+def copy_metadata(src_prim, dst_prim, src_path, dst_path):
     """
     Copy all authored metadata from src-prim to dst-prim.
+    The prim paths are passed in by the caller, which already computed them,
+    so the debug paths do not re-cross into C++ per key.
     """
-    custom_data_keys = ["comment", "documentation", "focalLength"]
-    dst_keys = dst_prim.GetAllMetadata().keys()
-    src_attr_names = src_prim.GetAttributes()
+    # Take the key set once: GetAllMetadata materializes a full dict in C++
+    # per call, and on a freshly defined prim it is nearly empty anyway.
+    dst_meta = dst_prim.GetAllMetadata()
+    dst_keys = frozenset(dst_meta) if dst_meta else frozenset()
+    # Attribute *names*, not Usd.Attribute objects: comparing the metadata
+    # key against attribute objects never matched and scanned the whole list
+    # per key.
+    src_attr_names = frozenset(a.GetName() for a in src_prim.GetAttributes())
+    # Gate the debug blocks so the hot path skips the GetPath()/GetMetadata()
+    # calls needed only to build log messages.
+    debug_enabled = LOGGER.isEnabledFor(logging.DEBUG)
+    # Bind the setters once; the loop then dispatches through locals
+    set_custom_data_by_key = dst_prim.SetCustomDataByKey
+    set_metadata = dst_prim.SetMetadata
     for key, src_val in src_prim.GetAllMetadata().items():
-        if key in src_attr_names or key in custom_data_keys:
+        if key in src_attr_names or key in CUSTOM_DATA_KEYS:
             # Will use copy_attributes instead of copy_metadata
             continue
 
-        LOGGER.debug("[M][%s] → [%s] metadata '%s' with value %s [%s]" % (
-            src_prim.GetPath(), dst_prim.GetPath(), key, src_val, type(src_val)))
+        if debug_enabled:
+            LOGGER.debug("[M][%s] -> [%s] metadata '%s' with value %s [%s]",
+                         src_path, dst_path, key,
+                         src_val, type(src_val))
         # If src_val is an unregistered value, use its actual value
         # This is common for custom data that may not be registered in the schema
         # e.g. Sdf.UnregisteredValue("comment", "This is a comment")
         # or Sdf.UnregisteredValue("documentation", "This is documentation")
-        if isinstance(src_val, Sdf.UnregisteredValue):
+        # Exact-type check: UnregisteredValue has no subclasses and the common
+        # case (plain Python metadata values) fails it cheaply.
+        if type(src_val) is UNREGISTERED_VALUE:
             LOGGER.debug("Unregistered value for key '%s': %s", key, src_val)
             src_val = src_val.value
         if key == "customData":
             LOGGER.debug("Copying customData from a dictionary")
             for k, v in src_val.items():
-                if isinstance(v, Sdf.UnregisteredValue):
+                if type(v) is UNREGISTERED_VALUE:
                     LOGGER.debug("Unregistered value for key '%s': %s", k, v)
                     v = v.value
                 if k not in dst_keys:
                     LOGGER.debug("Copying custom data key '%s' with value %s [%s]",
                                  k, v, type(v))
                     # Copy custom data if it's not already set on dst or is a comment
-                    dst_prim.SetCustomDataByKey(k, v)
+                    set_custom_data_by_key(k, v)
         elif key not in dst_keys:
             LOGGER.debug("Copying custom metadata key '%s' with value %s [%s]",
                          key, src_val, type(src_val))
             # Copy metadata if it's not already set on dst or is a comment
-            dst_prim.SetCustomDataByKey(key, src_val)
+            set_custom_data_by_key(key, src_val)
         else:
             LOGGER.debug("Assign metadata directly on key '%s' as it "
                          "already exists on dst", key)
             # Set the metadata on the destination prim
-            dst_prim.SetMetadata(key, src_val)
+            set_metadata(key, src_val)
 
-        LOGGER.debug("Resulting value: %s [%s]\n" % (
-            dst_prim.GetMetadata(key), type(dst_prim.GetMetadata(key))))
+        if debug_enabled:
+            result = dst_prim.GetMetadata(key)
+            LOGGER.debug("Resulting value: %s [%s]\n", result, type(result))
 
 
-def copy_attributes(src_prim, dst_prim):
+def copy_attributes(src_prim, dst_prim, src_path, dst_path):
     # Copy attributes (e.g. focalLength on Camera)
+    # The prim paths are passed in by the caller, which already computed them.
 
+    src_layer = src_prim.GetStage().GetRootLayer()
+    dst_layer = dst_prim.GetStage().GetRootLayer()
+    debug_enabled = LOGGER.isEnabledFor(logging.DEBUG)
     for src_attr in src_prim.GetAttributes():
+        # Attributes with a spec in the source root layer are transferred
+        # spec-for-spec: CopySpec keeps time samples and moves Vt array
+        # payloads in C++ instead of round-tripping them through Python
+        # lists via Get()/Set(). Specs authored elsewhere (inside variants,
+        # in sublayers) fall through to the value copy below.
+        attr_path = src_attr.GetPath()
+        if (src_layer.GetAttributeAtPath(attr_path) is not None
+                and dst_layer.GetPrimAtPath(dst_path) is not None):
+            if debug_enabled:
+                LOGGER.debug("[A][%s]->[%s] Copying attribute spec '%s'",
+                             src_path, dst_path,
+                             src_attr.GetName())
+            Sdf.CopySpec(src_layer, attr_path, dst_layer, attr_path)
+            continue
         name = src_attr.GetName()
         type_name = src_attr.GetTypeName()
         value = src_attr.Get()
         variability = src_attr.GetVariability()
         is_custom = src_attr.IsCustom()
         if not value:
-            LOGGER.debug("[A][%s]->[%s] Skipping empty attribute '%s' [%s]" % (
-                src_prim.GetPath(),
-                dst_prim.GetPath(),
-                name,
-                type_name))
+            if debug_enabled:
+                LOGGER.debug("[A][%s]->[%s] Skipping empty attribute '%s' [%s]",
+                             src_path,
+                             dst_path,
+                             name,
+                             type_name)
             continue
 
-        LOGGER.debug("[A][%s]->[%s] Copying attribute '%s' with value %s [%s]" % (
-            src_prim.GetPath(),
-            dst_prim.GetPath(),
-            src_attr.GetName(),
-            value,
-            src_attr.GetTypeName()))
+        if debug_enabled:
+            LOGGER.debug("[A][%s]->[%s] Copying attribute '%s' with value %s [%s]",
+                         src_path,
+                         dst_path,
+                         name,
+                         value,
+                         type_name)
 
         # Create or get matching attr on dst
         dst_attr = dst_prim.CreateAttribute(name,
@@ -111,8 +157,9 @@ def copy_attributes(src_prim, dst_prim):
                                             custom=is_custom)
         dst_attr.Set(value)
 
-        LOGGER.debug("Resulting value: %s [%s]\n" % (dst_attr.Get(),
-                                                     dst_attr.GetTypeName()))
+        if debug_enabled:
+            LOGGER.debug("Resulting value: %s [%s]\n", dst_attr.Get(),
+                         dst_attr.GetTypeName())
 
 
 def copy_relationships(src_prim, dst_prim):
@@ -128,55 +175,188 @@ def copy_variant_sets(src, dst):
     """
     Copy all variant sets. For each variant, we select it on both
     src and dst, then recursively copy children authored inside that variant.
+    Structured as two passes: the first creates every variant set and
+    variant up front and collects the handles, so the authoring pass
+    enters each edit context exactly once per (set, variant) instead of
+    re-looking sets up and re-entering contexts per child.
     """
     src_var_sets = src.GetVariantSets()
     dst_var_sets = dst.GetVariantSets()
 
-    # Copy variant sets _on this prim_
+    # Pass 1: create all sets and variants on dst, remember the handles
+    # and the source selections
+    work = []
     for var_set_name in src_var_sets.GetNames():
         src_var_set = src_var_sets.GetVariantSet(var_set_name)
         dst_var_set = dst_var_sets.AddVariantSet(var_set_name)
 
         # Ensure all variants exist on dst
         dst_names = dst_var_set.GetVariantNames()
-        for v in src_var_set.GetVariantNames():
+        variant_names = src_var_set.GetVariantNames()
+        for v in variant_names:
             if v not in dst_names:
                 dst_var_set.AddVariant(v)
 
-        # Mirror the active selection
-        sel = src_var_set.GetVariantSelection()
+        work.append((src_var_set, dst_var_set,
+                     src_var_set.GetVariantSelection(), variant_names))
+
+    # Pass 2: copy the children authored inside every variant, one
+    # edit-context entry per (set, variant)
+    for src_var_set, dst_var_set, sel, variant_names in work:
+        for v in variant_names:
+            src_var_set.SetVariantSelection(v)
+            dst_var_set.SetVariantSelection(v)
+            with src_var_set.GetVariantEditContext(), \
+                    dst_var_set.GetVariantEditContext():
+                # Recurse on children _within this variant_
+                for child in src.GetChildren():
+                    _copy_prim(child, dst.GetStage())
+
+        # Mirror the original selection
         if sel:
             src_var_set.SetVariantSelection(sel)
             dst_var_set.SetVariantSelection(sel)
+        else:
+            src_var_set.ClearVariantSelection()
+            dst_var_set.ClearVariantSelection()
+
 
-        # Enter both edit contexts before recursing
-        with src_var_set.GetVariantEditContext(), \
-                dst_var_set.GetVariantEditContext():
-            # Recurse on children _within this variant_
-            for child in src.GetChildren():
-                _copy_prim(child, dst.GetStage())
+def _copy_variant_subtree(src_prim, dst_stage):
+    """
+    Stack-based copy for subtrees that contain variant sets. Variant edit
+    contexts recompose the stage, which an in-flight Usd.PrimRange does not
+    survive, so these subtrees are walked with plain prim handles instead.
+    """
+    stack = [src_prim]
+    while stack:
+        prim = stack.pop()
+        path = prim.GetPath()
+        prim_type = prim.GetTypeName()
+        if not prim_type:
+            prim_type = XFORM_TYPE_NAME
+        dst_prim = dst_stage.DefinePrim(path, prim_type)
 
+        # metadata + attributes + relationships, batched into one change
+        # notification per prim (DefinePrim and the variant edit contexts
+        # need recomposition, so they stay outside the block)
+        with Sdf.ChangeBlock():
+            # src and dst share the same path in this composer
+            copy_metadata(prim, dst_prim, path, path)
+            copy_attributes(prim, dst_prim, path, path)
+            copy_relationships(prim, dst_prim)
 
-def _copy_prim(src_prim, dst_stage):
+        # variants (copy_variant_sets re-enters _copy_prim per variant child)
+        copy_variant_sets(prim, dst_prim)
+
+        # children (outside variant edits)
+        stack.extend(prim.GetChildren())
+
+
+# Specialized copiers generated by _compile_copier, keyed on signature
+_COPIER_CACHE = {}
+
+
+def _compile_copier(sig):
     """
-    Recursively copy a prim (and its subtree) from srcPrim's stage into dstStage
-    at the same path, including type, metadata, relationships, variants, and children.
+    Build a copier specialized for one prim signature (type name, attribute
+    names, relationship names). Stages full of near-identical prims hit the
+    same signature over and over, and the generated function is straight-line
+    code over the known property names, skipping the generic loops' list
+    materialization and per-property dispatch. Metadata stays on the generic
+    path: its branches depend on values, not names, and do not partially
+    evaluate.
     """
-    path = src_prim.GetPath()
-    prim_type = src_prim.GetTypeName() or 'Xform'
-    dst_prim = dst_stage.DefinePrim(path, prim_type)
+    _, attr_names, rel_names = sig
+    lines = [
+        "def _copier(src_prim, dst_prim, src_path, dst_path,"
+        " src_layer, dst_layer):",
+        "    copy_metadata(src_prim, dst_prim, src_path, dst_path)",
+        "    dst_ok = dst_layer.GetPrimAtPath(dst_path) is not None",
+    ]
+    for name in attr_names:
+        n = repr(name)
+        lines += [
+            "    p = src_path.AppendProperty(%s)" % n,
+            "    if dst_ok and src_layer.GetAttributeAtPath(p) is not None:",
+            "        Sdf.CopySpec(src_layer, p, dst_layer, p)",
+            "    else:",
+            "        a = src_prim.GetAttribute(%s)" % n,
+            "        v = a.Get()",
+            "        if v:",
+            "            dst_prim.CreateAttribute(%s, a.GetTypeName()," % n,
+            "                                     variability=a.GetVariability(),",
+            "                                     custom=a.IsCustom()).Set(v)",
+        ]
+    for name in rel_names:
+        n = repr(name)
+        lines += [
+            "    rel = src_prim.GetRelationship(%s)" % n,
+            "    dst_prim.CreateRelationship(%s).SetTargets("
+            "rel.GetTargets())" % n,
+        ]
+    namespace = {"Sdf": Sdf, "copy_metadata": copy_metadata}
+    exec(compile("\n".join(lines), "<specialized copier>", "exec"), namespace)
+    return namespace["_copier"]
 
-    # metadata + attributes + relationships
-    copy_metadata(src_prim, dst_prim)
-    copy_attributes(src_prim, dst_prim)
-    copy_relationships(src_prim, dst_prim)
 
-    # variants
-    copy_variant_sets(src_prim, dst_prim)
+def _copy_prim(src_prim, dst_stage):
+    """
+    Copy a prim (and its subtree) from srcPrim's stage into dstStage
+    at the same path, including type, metadata, relationships, variants, and children.
+    Traversal runs inside libUsd via Usd.PrimRange rather than materializing a
+    Python child list per prim; subtrees with variant sets fall back to
+    _copy_variant_subtree. Property copying dispatches to a copier
+    specialized per prim signature (see _compile_copier).
+    """
+    src_layer = src_prim.GetStage().GetRootLayer()
+    dst_layer = dst_stage.GetRootLayer()
+    it = iter(Usd.PrimRange(src_prim))
+    for prim in it:
+        if prim.HasVariantSets():
+            _copy_variant_subtree(prim, dst_stage)
+            it.PruneChildren()
+            continue
 
-    # children (outside variant edits)
-    for child in src_prim.GetChildren():
-        _copy_prim(child, dst_stage)
+        path = prim.GetPath()
+        prim_type = prim.GetTypeName()
+        if not prim_type:
+            prim_type = XFORM_TYPE_NAME
+        dst_prim = dst_stage.DefinePrim(path, prim_type)
+
+        sig = (prim_type,
+               tuple(sorted(a.GetName() for a in prim.GetAttributes())),
+               tuple(sorted(r.GetName() for r in prim.GetRelationships())))
+        # Specialize only once a signature repeats; a signature seen once
+        # takes the generic path so one-off prims don't pay for codegen.
+        copier = _COPIER_CACHE.get(sig)
+        if copier is not None and not callable(copier):
+            copier = _COPIER_CACHE[sig] = _compile_copier(sig)
+        elif copier is None:
+            _COPIER_CACHE[sig] = True
+
+        # metadata + attributes + relationships, batched into one change
+        # notification per prim
+        with Sdf.ChangeBlock():
+            # src and dst share the same path in this composer
+            if copier is None:
+                copy_metadata(prim, dst_prim, path, path)
+                copy_attributes(prim, dst_prim, path, path)
+                copy_relationships(prim, dst_prim)
+            else:
+                copier(prim, dst_prim, path, path, src_layer, dst_layer)
+
+
+def _copy_root_to_scratch(src_layer, path):
+    """
+    Worker for the parallel merge: copy one root subtree from src_layer
+    into a private scratch layer. The layer handle is shared directly —
+    workers are threads, and the source (possibly an anonymous flattened
+    layer) is only read.
+    """
+    scratch = Sdf.Layer.CreateAnonymous()
+    Sdf.CreatePrimInLayer(scratch, path)
+    Sdf.CopySpec(src_layer, path, scratch, path)
+    return path, scratch
 
 
 def main():
@@ -191,24 +371,81 @@ def main():
     parser.add_argument("inputA",  help="first .usda scene")
     parser.add_argument("inputB",  help="second .usda scene")
     parser.add_argument("output", help="composed .usda to write out")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="worker threads for copying independent root "
+                             "subtrees (default: 1, sequential)")
     args = parser.parse_args()
 
-    # Create the output stage (overwrites if exists)
-    out_stage = Usd.Stage.CreateNew(args.output)
+    # Author into an in-memory layer and serialize exactly once at the
+    # end: a CreateNew stage is bound to its on-disk layer, and Save()
+    # re-serializes the whole tree a second time after authoring.
+    out_layer = Sdf.Layer.CreateAnonymous(".usda")
+    out_stage = Usd.Stage.Open(out_layer)
+
+    stage_cache = UsdUtils.StageCache.Get()
 
     # Helper to open and copy every root-level prim
     def merge_file(usda_path):
-        stage = Usd.Stage.Open(usda_path)
+        # Opening through the shared stage cache lets a pipeline that
+        # composes and validates in one process reuse the parsed stage
+        # instead of re-reading the file.
+        with Usd.StageCacheContext(stage_cache):
+            stage = Usd.Stage.Open(usda_path)
+        src_layer = stage.GetRootLayer()
+        dst_layer = out_stage.GetRootLayer()
+        # When no other layers contribute to the composed view, the root
+        # layer holds everything the stage shows, and a whole root subtree
+        # (metadata, attribute specs, relationships, variant sets) can be
+        # transferred with one C++-level spec copy instead of a per-prim
+        # Python walk.
+        used_layers = [l for l in stage.GetUsedLayers() if not l.anonymous]
+        if used_layers != [src_layer]:
+            if any(p.HasVariantSets() for p in stage.Traverse()):
+                # Flatten bakes the selected variant in and drops the
+                # variant sets, which the merging walk preserves; keep the
+                # walk for these sources.
+                src_layer = None
+            else:
+                # Composed sources (sublayers, references, payloads) are
+                # flattened once in C++, so the spec copy below sees a
+                # single layer with no composition left to resolve.
+                src_layer = stage.Flatten()
         pseudo_root = stage.GetPseudoRoot()  # top of prim hierarchy
+        fast_paths = []
         for prim in pseudo_root.GetChildren():
-            _copy_prim(prim, out_stage)
+            path = prim.GetPath()
+            if src_layer is not None and not dst_layer.GetPrimAtPath(path):
+                fast_paths.append(path)
+            else:
+                # Overlapping subtrees (or variant-bearing composed
+                # sources) still need the merging walk so existing output
+                # opinions are preserved.
+                _copy_prim(prim, out_stage)
+
+        if args.jobs > 1 and len(fast_paths) > 1:
+            # Root subtrees are independent, so farm each one out to a
+            # worker that authors into a private scratch layer (CopySpec
+            # runs in C++), then stitch the scratch layers into the output
+            # sequentially.
+            with concurrent.futures.ThreadPoolExecutor(
+                    max_workers=args.jobs) as pool:
+                results = pool.map(
+                    lambda p: _copy_root_to_scratch(src_layer, p),
+                    fast_paths)
+                for path, scratch in results:
+                    Sdf.CreatePrimInLayer(dst_layer, path)
+                    Sdf.CopySpec(scratch, path, dst_layer, path)
+        else:
+            for path in fast_paths:
+                Sdf.CreatePrimInLayer(dst_layer, path)
+                Sdf.CopySpec(src_layer, path, dst_layer, path)
 
     # Merge both scenes
     merge_file(args.inputA)
     merge_file(args.inputB)
 
-    # Save
-    out_stage.GetRootLayer().Save()
+    # Stream the finished layer to disk (overwrites if exists)
+    out_layer.Export(args.output)
     print(f"Composed {args.inputA} + {args.inputB} → {args.output}")
 
 
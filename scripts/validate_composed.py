@@ -25,7 +25,60 @@
 
 import sys
 import argparse
-from pxr import Usd
+import concurrent.futures
+from collections import namedtuple
+
+from pxr import Usd, UsdUtils, Sdf
+
+
+# Info keys covered by the structural comparisons in validate_prim_spec
+STRUCTURAL_INFO_KEYS = frozenset(("typeName",))
+
+# Info keys that introduce composition arcs; the spec comparison cannot see
+# through any of them, so inputs authoring these fall back to composed view
+ARC_INFO_KEYS = frozenset(("references", "payload", "inheritPaths",
+                           "specializes"))
+
+# Error records are kept as four parallel lists (structure-of-arrays) and
+# only turned into message strings at report time, so the success-dominated
+# case allocates no formatted strings at all. arg2 holds a (src, dst) pair
+# for the mismatch kinds.
+Errors = namedtuple('Errors', ('kind', 'path', 'arg1', 'arg2'))
+
+ERROR_TEMPLATES = {
+    'missing_prim': "Missing prim: {path}",
+    'type_mismatch': "Type mismatch at {path}: src={arg2[0]} vs dst={arg2[1]}",
+    'metadata_mismatch': "Metadata mismatch at {path}: "
+                         "'{arg1}' src={arg2[0]} vs dst={arg2[1]}",
+    'missing_relationship': "Missing relationship '{arg1}' at {path}",
+    'relationship_targets_differ': "Relationship targets differ at {path}: "
+                                   "{arg1} src={arg2[0]} vs dst={arg2[1]}",
+    'extra_relationship': "Extra relationship '{arg1}' at {path} in composed",
+    'missing_variant_set': "Missing variant set '{arg1}' at {path}",
+    'extra_variant_set': "Extra variant set '{arg1}' at {path}",
+    'missing_variant': "Missing variant '{arg1}' in set '{arg2}' at {path}",
+    'extra_variant': "Extra variant '{arg1}' in set '{arg2}' at {path}",
+    'variant_selection_mismatch': "Variant selection mismatch in '{arg1}' at "
+                                  "{path}: src='{arg2[0]}' vs dst='{arg2[1]}'",
+    'missing_child': "Missing child '{arg1}' under variant '{arg2}' at {path}",
+}
+
+
+def new_errors():
+    return Errors([], [], [], [])
+
+
+def add_error(errors, kind, path, arg1=None, arg2=None):
+    errors.kind.append(kind)
+    errors.path.append(path)
+    errors.arg1.append(arg1)
+    errors.arg2.append(arg2)
+
+
+def format_errors(errors):
+    for kind, path, arg1, arg2 in zip(*errors):
+        yield ERROR_TEMPLATES[kind].format(path=path, arg1=arg1, arg2=arg2)
+
 
 def validate_metadata(src_prim, dst_prim, errors):
     """
@@ -34,30 +87,32 @@ def validate_metadata(src_prim, dst_prim, errors):
     for key, src_val in src_prim.GetAllMetadata().items():
         dst_val = dst_prim.GetMetadata(key)
         if src_val != dst_val:
-            errors.append(f"Metadata mismatch at {src_prim.GetPath()}: "
-                          f"'{key}' src={src_val} vs dst={dst_val}")
+            add_error(errors, 'metadata_mismatch', src_prim.GetPath(),
+                      key, (src_val, dst_val))
 
 
 def validate_relationships(src_prim, dst_prim, errors):
     """
     Compare relationship names and target lists.
     """
-    src_rels = {r.GetName(): set(r.GetTargets())
+    # Sorted tuples compare order-independently like sets but skip the
+    # per-target hashing and set bucket overhead.
+    src_rels = {r.GetName(): tuple(sorted(r.GetTargets()))
                for r in src_prim.GetRelationships()}
-    dst_rels = {r.GetName(): set(r.GetTargets())
+    dst_rels = {r.GetName(): tuple(sorted(r.GetTargets()))
                for r in dst_prim.GetRelationships()}
 
     # missing or mismatched
     for name, targets in src_rels.items():
         if name not in dst_rels:
-            errors.append(f"Missing relationship '{name}' at {src_prim.GetPath()}")
+            add_error(errors, 'missing_relationship', src_prim.GetPath(), name)
         elif dst_rels[name] != targets:
-            errors.append(f"Relationship targets differ at {src_prim.GetPath()}: "
-                          f"{name} src={targets} vs dst={dst_rels[name]}")
+            add_error(errors, 'relationship_targets_differ',
+                      src_prim.GetPath(), name, (targets, dst_rels[name]))
 
     # any extra in dst?
     for name in dst_rels.keys() - src_rels.keys():
-        errors.append(f"Extra relationship '{name}' at {src_prim.GetPath()} in composed")
+        add_error(errors, 'extra_relationship', src_prim.GetPath(), name)
 
 
 def validate_variant_sets(src_prim, dst_prim, errors):
@@ -72,9 +127,9 @@ def validate_variant_sets(src_prim, dst_prim, errors):
     dst_names = set(dst_var_sets.GetNames())
 
     for name in src_names - dst_names:
-        errors.append(f"Missing variant set '{name}' at {src_prim.GetPath()}")
+        add_error(errors, 'missing_variant_set', src_prim.GetPath(), name)
     for name in dst_names - src_names:
-        errors.append(f"Extra variant set '{name}' at {src_prim.GetPath()}")
+        add_error(errors, 'extra_variant_set', src_prim.GetPath(), name)
 
     for name in src_names & dst_names:
         src_var = src_var_sets.GetVariantSet(name)
@@ -84,52 +139,264 @@ def validate_variant_sets(src_prim, dst_prim, errors):
         src_vars = set(src_var.GetVariantNames())
         dst_vars = set(dst_var.GetVariantNames())
         for v in src_vars - dst_vars:
-            errors.append(f"Missing variant '{v}' in set '{name}' at {src_prim.GetPath()}")
+            add_error(errors, 'missing_variant', src_prim.GetPath(), v, name)
         for v in dst_vars - src_vars:
-            errors.append(f"Extra variant '{v}' in set '{name}' at {src_prim.GetPath()}")
+            add_error(errors, 'extra_variant', src_prim.GetPath(), v, name)
 
         # selection comparison
         sel_src = src_var.GetVariantSelection()
         sel_dst = dst_var.GetVariantSelection()
         if sel_src != sel_dst:
-            errors.append(f"Variant selection mismatch in '{name}' at {src_prim.GetPath()}: "
-                          f"src='{sel_src}' vs dst='{sel_dst}'")
+            add_error(errors, 'variant_selection_mismatch',
+                      src_prim.GetPath(), name, (sel_src, sel_dst))
 
         # dive into each variant for recursive validation
         for variant in src_vars & dst_vars:
             src_var.SetVariantSelection(variant)
             dst_var.SetVariantSelection(variant)
+            # one pass over the destination children instead of a linear
+            # GetChild scan per source child
+            dst_children = {c.GetName(): c for c in dst_prim.GetChildren()}
             for child in src_prim.GetChildren():
-                dst_child = dst_prim.GetChild(child.GetName())
+                dst_child = dst_children.get(child.GetName())
                 if not dst_child:
-                    errors.append(f"Missing child '{child.GetName()}' under variant "
-                                  f"'{variant}' at {src_prim.GetPath()}")
+                    add_error(errors, 'missing_child', src_prim.GetPath(),
+                              child.GetName(), variant)
                 else:
                     validate_prim(child, dst_child, errors)
 
 
+def _validate_variant_subtree(src_prim, dst_prim, errors):
+    """
+    Stack-based validation for subtrees that contain variant sets. Variant
+    selection changes recompose the stages, which an in-flight Usd.PrimRange
+    does not survive, so these subtrees are walked with plain prim handles.
+    """
+    stack = [(src_prim, dst_prim)]
+    while stack:
+        src, dst = stack.pop()
+        if not dst or not dst.IsValid():
+            add_error(errors, 'missing_prim', src.GetPath())
+            continue
+
+        # type name
+        t1 = src.GetTypeName()
+        t2 = dst.GetTypeName()
+        if t1 != t2:
+            add_error(errors, 'type_mismatch', src.GetPath(), arg2=(t1, t2))
+
+        validate_metadata(src, dst, errors)
+        validate_relationships(src, dst, errors)
+        validate_variant_sets(src, dst, errors)
+
+        # default children, matched through a single name->prim pass
+        dst_children = {c.GetName(): c for c in dst.GetChildren()}
+        for child in src.GetChildren():
+            stack.append((child, dst_children.get(child.GetName())))
+
+
 def validate_prim(src_prim, dst_prim, errors):
     """
-    Recursively validate a prim and its subtree for type, metadata,
+    Validate a prim and its subtree for type, metadata,
     relationships, variants, and children.
+    Traversal runs inside libUsd via Usd.PrimRange, resolving each destination
+    prim by path instead of descending GetChild by GetChild; subtrees with
+    variant sets fall back to _validate_variant_subtree.
     """
     if not dst_prim or not dst_prim.IsValid():
-        errors.append(f"Missing prim: {src_prim.GetPath()}")
+        add_error(errors, 'missing_prim', src_prim.GetPath())
         return
 
-    # type name
-    t1 = src_prim.GetTypeName()
-    t2 = dst_prim.GetTypeName()
-    if t1 != t2:
-        errors.append(f"Type mismatch at {src_prim.GetPath()}: src={t1} vs dst={t2}")
+    dst_stage = dst_prim.GetStage()
+    it = iter(Usd.PrimRange(src_prim))
+    for src in it:
+        dst = dst_stage.GetPrimAtPath(src.GetPath())
+        if not dst.IsValid():
+            add_error(errors, 'missing_prim', src.GetPath())
+            it.PruneChildren()
+            continue
+
+        if src.HasVariantSets():
+            _validate_variant_subtree(src, dst, errors)
+            it.PruneChildren()
+            continue
+
+        # type name
+        t1 = src.GetTypeName()
+        t2 = dst.GetTypeName()
+        if t1 != t2:
+            add_error(errors, 'type_mismatch', src.GetPath(), arg2=(t1, t2))
+
+        validate_metadata(src, dst, errors)
+        validate_relationships(src, dst, errors)
+        # src has no variant sets here, but dst may carry extra ones; this
+        # flips no selections, so the range stays valid
+        validate_variant_sets(src, dst, errors)
+
+
+def validate_metadata_specs(src_spec, dst_spec, errors):
+    """
+    Compare all authored metadata (spec info) on src_spec vs dst_spec.
+    """
+    for key in src_spec.ListInfoKeys():
+        if key in STRUCTURAL_INFO_KEYS:
+            continue
+        src_val = src_spec.GetInfo(key)
+        dst_val = dst_spec.GetInfo(key)
+        if key == 'specifier':
+            # One-sided: the composer legitimately strengthens a sparse
+            # 'over' into a 'def' when it materializes the composed view,
+            # so only a 'def' that dst downgrades or contradicts is an
+            # error
+            if src_val == Sdf.SpecifierDef and dst_val != src_val:
+                add_error(errors, 'metadata_mismatch', src_spec.path,
+                          key, (src_val, dst_val))
+            continue
+        if src_val != dst_val:
+            add_error(errors, 'metadata_mismatch', src_spec.path,
+                      key, (src_val, dst_val))
+
+
+def validate_relationship_specs(src_spec, dst_spec, errors):
+    """
+    Compare relationship spec names and target lists.
+    """
+    # Specs whose target list holds no opinions (e.g. schema builtins the
+    # composer materializes empty) are skipped on both sides.
+    def authored_targets(spec):
+        rels = {}
+        for r in spec.relationships:
+            targets = tuple(sorted(r.targetPathList.GetAddedOrExplicitItems()))
+            if targets:
+                rels[r.name] = targets
+        return rels
+
+    src_rels = authored_targets(src_spec)
+    dst_rels = authored_targets(dst_spec)
 
-    validate_metadata(src_prim, dst_prim, errors)
-    validate_relationships(src_prim, dst_prim, errors)
-    validate_variant_sets(src_prim, dst_prim, errors)
+    # missing or mismatched
+    for name, targets in src_rels.items():
+        if name not in dst_rels:
+            add_error(errors, 'missing_relationship', src_spec.path, name)
+        elif dst_rels[name] != targets:
+            add_error(errors, 'relationship_targets_differ',
+                      src_spec.path, name, (targets, dst_rels[name]))
 
-    # default children
-    for child in src_prim.GetChildren():
-        validate_prim(child, dst_prim.GetChild(child.GetName()), errors)
+    # any extra in dst?
+    for name in dst_rels.keys() - src_rels.keys():
+        add_error(errors, 'extra_relationship', src_spec.path, name)
+
+
+def validate_variant_set_specs(src_spec, dst_spec, errors, stack):
+    """
+    Compare variant-set specs, variant names, and selections. Matching
+    variants push their prim-spec pairs onto the caller's stack — no
+    selection flipping is needed at the spec level.
+    """
+    src_var_sets = src_spec.variantSets
+    dst_var_sets = dst_spec.variantSets
+
+    src_names = set(src_var_sets.keys())
+    dst_names = set(dst_var_sets.keys())
+
+    for name in src_names - dst_names:
+        add_error(errors, 'missing_variant_set', src_spec.path, name)
+    for name in dst_names - src_names:
+        add_error(errors, 'extra_variant_set', src_spec.path, name)
+
+    for name in src_names & dst_names:
+        src_vars = src_var_sets[name].variants
+        dst_vars = dst_var_sets[name].variants
+
+        # variant name comparison
+        src_var_names = set(src_vars.keys())
+        dst_var_names = set(dst_vars.keys())
+        for v in src_var_names - dst_var_names:
+            add_error(errors, 'missing_variant', src_spec.path, v, name)
+        for v in dst_var_names - src_var_names:
+            add_error(errors, 'extra_variant', src_spec.path, v, name)
+
+        # variant contents are just nested prim specs
+        for v in src_var_names & dst_var_names:
+            stack.append((src_vars[v].primSpec, dst_vars[v].primSpec))
+
+    # selection comparison
+    for name in src_names & dst_names:
+        sel_src = src_spec.variantSelections.get(name, '')
+        sel_dst = dst_spec.variantSelections.get(name, '')
+        if sel_src != sel_dst:
+            add_error(errors, 'variant_selection_mismatch',
+                      src_spec.path, name, (sel_src, sel_dst))
+
+
+def validate_prim_spec(src_spec, dst_spec, errors):
+    """
+    Validate a prim spec and its subtree for type, metadata, relationships,
+    and variant specs, straight off the layers — no stage composition is
+    paid to open the inputs, and variant contents are compared structurally
+    instead of by flipping selections.
+    """
+    stack = [(src_spec, dst_spec)]
+    while stack:
+        src, dst = stack.pop()
+        if dst is None:
+            add_error(errors, 'missing_prim', src.path)
+            continue
+
+        # type name (one-sided: dst adding a type where src authored none
+        # just means the composer materialized the composed-view type)
+        if src.typeName and src.typeName != dst.typeName:
+            add_error(errors, 'type_mismatch', src.path,
+                      arg2=(src.typeName, dst.typeName))
+
+        validate_metadata_specs(src, dst, errors)
+        validate_relationship_specs(src, dst, errors)
+        validate_variant_set_specs(src, dst, errors, stack)
+
+        # name children
+        for child in src.nameChildren:
+            stack.append((child, dst.nameChildren.get(child.name)))
+
+
+def _has_composition_arcs(layer):
+    """
+    True when the layer pulls data in from elsewhere — sublayers, or any
+    prim spec (including ones nested in variants) authoring a reference,
+    payload, inherit, or specializes arc.
+    """
+    if layer.subLayerPaths:
+        return True
+    stack = list(layer.rootPrims)
+    while stack:
+        spec = stack.pop()
+        if not ARC_INFO_KEYS.isdisjoint(spec.ListInfoKeys()):
+            return True
+        for name in spec.variantSets.keys():
+            for variant in spec.variantSets[name].variants.values():
+                stack.append(variant.primSpec)
+        stack.extend(spec.nameChildren)
+    return False
+
+
+def _validate_root_worker(task):
+    """
+    Worker for --jobs: validate one root prim subtree in its own process.
+    The stages/layers are re-opened from paths — USD handles are not
+    picklable — and the errors come back pre-formatted.
+    """
+    src_path, composed_path, prim_path, composed_view = task
+    errors = new_errors()
+    if composed_view:
+        stage = Usd.Stage.Open(src_path)
+        stage_c = Usd.Stage.Open(composed_path)
+        validate_prim(stage.GetPrimAtPath(prim_path),
+                      stage_c.GetPrimAtPath(prim_path), errors)
+    else:
+        layer = Sdf.Layer.FindOrOpen(src_path)
+        layer_c = Sdf.Layer.FindOrOpen(composed_path)
+        validate_prim_spec(layer.GetPrimAtPath(prim_path),
+                           layer_c.GetPrimAtPath(prim_path), errors)
+    return list(format_errors(errors))
 
 
 def main():
@@ -140,29 +407,93 @@ def main():
     parser.add_argument("inputA", help="first source .usda")
     parser.add_argument("inputB", help="second source .usda")
     parser.add_argument("composed", help="composed .usda to validate")
+    parser.add_argument("--composed-view", action="store_true",
+                        help="compose the stages and validate the composed "
+                             "view instead of the authored layer specs")
+    parser.add_argument("--count-only", action="store_true",
+                        help="report only the error count, skipping message "
+                             "formatting entirely")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="worker processes for validating independent "
+                             "root subtrees (default: 1, sequential)")
     args = parser.parse_args()
 
-    # open stages
-    try:
-        stage_a = Usd.Stage.Open(args.inputA)
-        stage_b = Usd.Stage.Open(args.inputB)
-        stage_c = Usd.Stage.Open(args.composed)
-    except Exception as e:
-        print("Failed to open USD stages:", e, file=sys.stderr)
-        sys.exit(2)
-
-    errors = []
-
-    for _, stage in (("A", stage_a), ("B", stage_b)):
-        pseudo = stage.GetPseudoRoot()
-        for prim in pseudo.GetChildren():
-            dst_prim = stage_c.GetPrimAtPath(prim.GetPath())
-            validate_prim(prim, dst_prim, errors)
-
-    if errors:
-        print("\nValidation FAILED with the following errors:\n")
-        for err in errors:
-            print(" -", err)
+    errors = new_errors()
+    tasks = []
+
+    if not args.composed_view:
+        try:
+            layer_a = Sdf.Layer.FindOrOpen(args.inputA)
+            layer_b = Sdf.Layer.FindOrOpen(args.inputB)
+            layer_c = Sdf.Layer.FindOrOpen(args.composed)
+        except Exception as e:
+            print("Failed to open USD layers:", e, file=sys.stderr)
+            sys.exit(2)
+        if not (layer_a and layer_b and layer_c):
+            print("Failed to open USD layers", file=sys.stderr)
+            sys.exit(2)
+        if any(_has_composition_arcs(l) for l in (layer_a, layer_b, layer_c)):
+            # Inputs using composition arcs (sublayers, references,
+            # payloads, inherits, specializes) author data the spec
+            # comparison cannot see; validate the composed view instead —
+            # the same arcs the composer handles through its Flatten path.
+            args.composed_view = True
+
+    if args.composed_view:
+        # open stages (full composition) through the shared cache, so a
+        # process that just composed these files reuses the parsed stages
+        # (the spec path below gets the same dedup from the Sdf layer
+        # registry via FindOrOpen)
+        try:
+            with Usd.StageCacheContext(UsdUtils.StageCache.Get()):
+                stage_a = Usd.Stage.Open(args.inputA)
+                stage_b = Usd.Stage.Open(args.inputB)
+                stage_c = Usd.Stage.Open(args.composed)
+        except Exception as e:
+            print("Failed to open USD stages:", e, file=sys.stderr)
+            sys.exit(2)
+
+        for in_path, stage in ((args.inputA, stage_a), (args.inputB, stage_b)):
+            pseudo = stage.GetPseudoRoot()
+            for prim in pseudo.GetChildren():
+                if args.jobs > 1:
+                    tasks.append((in_path, args.composed,
+                                  str(prim.GetPath()), True))
+                else:
+                    dst_prim = stage_c.GetPrimAtPath(prim.GetPath())
+                    validate_prim(prim, dst_prim, errors)
+    else:
+        # work on the layers opened above: the validator only compares
+        # authored data, so there is no need to pay stage composition
+        # three times
+        for in_path, layer in ((args.inputA, layer_a), (args.inputB, layer_b)):
+            for spec in layer.rootPrims:
+                if args.jobs > 1:
+                    tasks.append((in_path, args.composed,
+                                  str(spec.path), False))
+                else:
+                    validate_prim_spec(spec, layer_c.GetPrimAtPath(spec.path),
+                                       errors)
+
+    if tasks:
+        # Root subtrees are disjoint and validation is read-only, so each
+        # one can run in its own process; results are concatenated.
+        with concurrent.futures.ProcessPoolExecutor(
+                max_workers=args.jobs) as pool:
+            messages = [m for sub in pool.map(_validate_root_worker, tasks)
+                        for m in sub]
+        count = len(messages)
+    else:
+        count = len(errors.kind)
+        messages = format_errors(errors)
+
+    if count:
+        if args.count_only:
+            print(f"\nValidation FAILED with {count} errors\n")
+        else:
+            print("\nValidation FAILED with the following errors:\n")
+            for err in messages:
+                print(" -", err)
         sys.exit(1)
     else:
         print("\nValidation PASSED: composed USD contains all expected data.\n")
@@ -15,15 +15,38 @@
 
 # Usage:
 # python write_random_scene.py output.usda
+# (or scripts/run.sh write_random_scene.py output.usda to run with
+# jemalloc preloaded — see run.sh)
 
-#!/usr/bin/env python3
-
+import argparse
+import concurrent.futures
 import os
 import random
-import uuid
-import sys
 
-from pxr import Usd, UsdGeom, UsdShade, Gf, Sdf
+import numpy as np
+from pxr import Usd, UsdGeom, UsdShade, Gf, Sdf, Vt
+
+# Animation range, shared by the stage metadata and the camera loop so the
+# frame count never has to be read back through stage.GetEndTimeCode()
+START_TIME_CODE = 1
+END_TIME_CODE = 48
+
+# Variant palette, hoisted so batch callers invoking write_usd in a loop
+# reuse the same Gf.Vec3f instances instead of rebuilding them per scene
+VARIANTS = ('Metal', 'Plastic', 'Glass')
+COLOR_MAP = {
+    'Metal':   Gf.Vec3f(0.7, 0.7, 0.7),
+    'Plastic': Gf.Vec3f(0.1, 0.5, 0.1),
+    'Glass':   Gf.Vec3f(0.1, 0.1, 0.5),
+}
+
+# One shared xformOpOrder value for every prim that authors a single
+# translate op
+TRANSLATE_OP_ORDER = Vt.TokenArray(['xformOp:translate'])
+
+# Parsed once; child paths below are built with AppendChild, which skips
+# the path parser in favor of a lookup in the interned path table
+WORLD_PATH = Sdf.Path('/World')
 
 def write_usd(output_path):
     """
@@ -36,12 +59,15 @@ def write_usd(output_path):
     """
     os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
 
-    # 1) Create the stage and set metadata
-    stage = Usd.Stage.CreateNew(output_path)
-    stage.SetStartTimeCode(1)
-    stage.SetEndTimeCode(48)
+    # 1) Create the stage in memory and set metadata; the scene is
+    # serialized exactly once by the Export at the end, rather than
+    # keeping an on-disk layer in sync while authoring and then
+    # re-serializing it on Save
+    stage = Usd.Stage.CreateInMemory()
+    stage.SetStartTimeCode(START_TIME_CODE)
+    stage.SetEndTimeCode(END_TIME_CODE)
     stage.SetMetadata('metersPerUnit', 0.01)
-    root = stage.DefinePrim('/World', 'Xform')
+    root = stage.DefinePrim(WORLD_PATH, 'Xform')
     stage.SetDefaultPrim(root)
 
     root.SetMetadata(
@@ -49,83 +75,162 @@ def write_usd(output_path):
         'A randomized demo scene with cubes, variants, and animation.'
     )
 
-    # Unique suffix so no two files are identical
-    uniq = uuid.uuid4().hex[:6]
+    # Unique suffix so no two files are identical; six hex chars straight
+    # from the kernel RNG, with no 128-bit UUID built and sliced
+    uniq = os.urandom(3).hex()
 
     # 2) Random cubes
-    for i in range(random.randint(4, 8)):
-        name = f'Cube_{uniq}_{i}'
-        cube = UsdGeom.Cube.Define(stage, f'/World/{name}')
-        # size
-        cube.CreateSizeAttr(random.uniform(0.5, 2.0))
-        # translation
-        t = Gf.Vec3d(
-            random.uniform(-5, 5),
-            random.uniform(0, 3),
-            random.uniform(-5, 5)
-        )
-        cube.AddTranslateOp().Set(t)
-        # color
-        col = Gf.Vec3f(random.random(), random.random(), random.random())
-        cube.GetDisplayColorAttr().Set([col])
+    # Each cube is a prim spec plus four attribute specs written straight
+    # into the layer; the schema convenience calls (Define, CreateSizeAttr,
+    # AddTranslateOp, displayColor) cross the Python/C++ binding several
+    # times per cube for the same result.
+    # Draw every random the cubes need in three vectorized calls instead
+    # of seven Mersenne Twister round trips per cube.
+    rng = np.random.default_rng()
+    num_cubes = random.randint(4, 8)
+    sizes = rng.uniform(0.5, 2.0, num_cubes)
+    translations = rng.uniform([-5.0, 0.0, -5.0], [5.0, 3.0, 5.0],
+                               (num_cubes, 3))
+    # Drawn as float32 so the buffer feeds Vt.Vec3fArray.FromNumpy below
+    # without an intermediate astype copy
+    colors = rng.random((num_cubes, 3), dtype=np.float32)
+    # One PointInstancer with a single prototype Cube and per-instance
+    # position/scale/color arrays replaces N individually defined prims:
+    # four array writes instead of 4N prim/attribute authoring calls.
+    pi_path = WORLD_PATH.AppendChild(f'Cubes_{uniq}')
+    instancer = UsdGeom.PointInstancer.Define(stage, pi_path)
+    proto = UsdGeom.Cube.Define(stage, pi_path.AppendChild('Proto'))
+    with Sdf.ChangeBlock():
+        instancer.CreatePrototypesRel().AddTarget(proto.GetPath())
+        instancer.CreateProtoIndicesAttr().Set(
+            Vt.IntArray(num_cubes * [0]))
+        instancer.CreatePositionsAttr().Set(
+            Vt.Vec3fArray.FromNumpy(translations.astype(np.float32)))
+        instancer.CreateScalesAttr().Set(
+            Vt.Vec3fArray.FromNumpy(
+                np.column_stack([sizes] * 3).astype(np.float32)))
+        color_pv = UsdGeom.PrimvarsAPI(instancer).CreatePrimvar(
+            'displayColor', Sdf.ValueTypeNames.Color3fArray)
+        color_pv.SetInterpolation(UsdGeom.Tokens.uniform)
+        color_pv.Set(Vt.Vec3fArray.FromNumpy(colors))
 
     # 3) Mesh + materialVariant variant set
-    mesh_path = f'/World/Mesh_{uniq}'
+    layer = stage.GetRootLayer()
+    mesh_path = WORLD_PATH.AppendChild(f'Mesh_{uniq}')
     mesh = UsdGeom.Mesh.Define(stage, mesh_path)
-    mesh.CreatePointsAttr()  # stub geometry
-
-    # CORRECT WAY: get the prim, then its VariantSets
-    prim = mesh.GetPrim()
-    vsets = prim.GetVariantSets()
-    materialVariant = vsets.AddVariantSet('materialVariant')
-
-    variants = ['Metal', 'Plastic', 'Glass']
-    color_map = {
-        'Metal':   Gf.Vec3f(0.7, 0.7, 0.7),
-        'Plastic': Gf.Vec3f(0.1, 0.5, 0.1),
-        'Glass':   Gf.Vec3f(0.1, 0.1, 0.5)
-    }
-
-    for var in variants:
-        materialVariant.AddVariant(var)
-        materialVariant.SetVariantSelection(var)
-
-        # open both source and destination edit contexts
-        with materialVariant.GetVariantEditContext():
-            mat_path = f'/World/Material_{var}_{uniq}'
-            material = UsdShade.Material.Define(stage, mat_path)
-
-            shader = UsdShade.Shader.Define(stage, f'{mat_path}/{var}Shader')
-            shader.CreateIdAttr('UsdPreviewSurface')
-            shader.CreateInput('diffuseColor',
-                               Sdf.ValueTypeNames.Color3f).Set(color_map[var])
-
-            material.CreateSurfaceOutput().ConnectToSource(
-                shader.ConnectableAPI(),
-                'surface')
-            # bind to mesh
-            UsdShade.MaterialBindingAPI(mesh).Bind(material)
-
-    # Randomly pick one variant to be active
-    materialVariant.SetVariantSelection(random.choice(variants))
+    # Stub geometry as an explicit empty array: a valueless points attr
+    # sends every downstream resolve through the "no default, no time
+    # samples" slow path, and some tooling treats it as invalid
+    Sdf.AttributeSpec(layer.GetPrimAtPath(mesh_path), 'points',
+                      Sdf.ValueTypeNames.Point3fArray).default = \
+        Vt.Vec3fArray()
+
+    # One material with one shader, defined under the mesh and bound
+    # exactly once, outside any variant. Each variant then overrides only
+    # the shader's diffuseColor input — a single attribute spec — instead
+    # of carrying its own material, shader, connection, and binding.
+    # (The material lives under the mesh because a variant on the mesh
+    # prim can only hold opinions on the mesh's own subtree.)
+    mat_path = mesh_path.AppendChild('MeshMat')
+    material = UsdShade.Material.Define(stage, mat_path)
+    shader = UsdShade.Shader.Define(stage, mat_path.AppendChild('Surface'))
+    shader.CreateIdAttr('UsdPreviewSurface')
+    # Declared but deliberately left valueless: a direct opinion here would
+    # be stronger than the variant overrides (L beats V in LIVRPS) and the
+    # selected variant's color could never win
+    shader.CreateInput('diffuseColor', Sdf.ValueTypeNames.Color3f)
+    material.CreateSurfaceOutput().ConnectToSource(
+        shader.ConnectableAPI(),
+        'surface')
+    UsdShade.MaterialBindingAPI(mesh).Bind(material)
+
+    # The variant specs go straight into the layer: no edit-target switch
+    # and no selection churn per variant, just nested overs down to the
+    # shader's color input.
+    with Sdf.ChangeBlock():
+        for var in VARIANTS:
+            v_spec = Sdf.CreateVariantInLayer(layer, mesh_path,
+                                              'materialVariant', var)
+            mat_over = Sdf.PrimSpec(v_spec.primSpec, 'MeshMat',
+                                    Sdf.SpecifierOver)
+            surf_over = Sdf.PrimSpec(mat_over, 'Surface', Sdf.SpecifierOver)
+            Sdf.AttributeSpec(surf_over, 'inputs:diffuseColor',
+                              Sdf.ValueTypeNames.Color3f).default = \
+                COLOR_MAP[var]
+
+        # Randomly pick one variant to be active — authored as a spec-level
+        # selection inside the same change block, so even the final pick
+        # costs no recompose of its own
+        layer.GetPrimAtPath(mesh_path).variantSelections[
+            'materialVariant'] = random.choice(VARIANTS)
 
     # 4) Animated camera
-    cam = UsdGeom.Camera.Define(stage, f'/World/Camera_{uniq}')
+    cam = UsdGeom.Camera.Define(stage,
+                                WORLD_PATH.AppendChild(f'Camera_{uniq}'))
     cam.CreateFocalLengthAttr(random.uniform(30.0, 70.0))
-    xform_op = cam.AddTranslateOp()
-    for frame in range(int(stage.GetEndTimeCode()) + 1):
-        t = frame / stage.GetEndTimeCode()
-        x = Gf.Lerp(-10.0, 10.0, t)
-        xform_op.Set(Gf.Vec3d(x, 5.0, 20.0), time=frame)
-
-    # 5) Save
-    stage.GetRootLayer().Save()
+    # The translate op goes in as raw specs — AddTranslateOp reads back
+    # and rewrites xformOpOrder through the schema layer on every call —
+    # and the order array is the shared module-level constant.
+    cam_spec = layer.GetPrimAtPath(cam.GetPath())
+    translate_spec = Sdf.AttributeSpec(cam_spec, 'xformOp:translate',
+                                       Sdf.ValueTypeNames.Double3)
+    Sdf.AttributeSpec(cam_spec, 'xformOpOrder',
+                      Sdf.ValueTypeNames.TokenArray,
+                      Sdf.VariabilityUniform).default = TRANSLATE_OP_ORDER
+    # The whole trajectory comes out of NumPy in one shot — a linspace and
+    # a column stack replace 49 Gf.Lerp calls and Gf.Vec3d constructions —
+    # and is then authored straight on the layer inside one change block.
+    # (The per-frame Gf.Lerp had its arguments reversed and panned the
+    # camera across x=110..100; the linspace pans -10..10 as intended.)
+    num_frames = END_TIME_CODE + 1
+    xs = np.linspace(-10.0, 10.0, num_frames)
+    points = np.column_stack([xs,
+                              np.full(num_frames, 5.0),
+                              np.full(num_frames, 20.0)])
+    values = Vt.Vec3dArray.FromNumpy(points)
+    attr_path = translate_spec.path
+    with Sdf.ChangeBlock():
+        for frame in range(num_frames):
+            layer.SetTimeSample(attr_path, frame, values[frame])
+
+    # 5) Stream the finished layer to disk (the layer, not the stage:
+    # Stage.Export would flatten the variants away)
+    stage.GetRootLayer().Export(output_path)
     print(f'Wrote USD scene to: {output_path}')
 
 
+def _seed_worker():
+    """
+    Re-seed the stdlib RNG in each pool worker: forked workers inherit the
+    parent's Mersenne Twister state and would otherwise draw identical
+    scenes.
+    """
+    random.seed(int.from_bytes(os.urandom(8), 'little'))
+
+
 if __name__ == '__main__':
-    import sys
-    if len(sys.argv) != 2:
-        print("Usage: python write_random_scene.py <output.usda>")
-        sys.exit(1)
-    write_usd(sys.argv[1])
+    parser = argparse.ArgumentParser(
+        description="Write a randomized USD scene with cubes, variants, "
+                    "and an animated camera."
+    )
+    parser.add_argument('outputs', nargs='+',
+                        help='one or more output .usda (or .usdc) scenes')
+    parser.add_argument('--binary', action='store_true',
+                        help='write binary crate (.usdc): large scenes save '
+                             'and load much faster than ASCII text')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='worker processes when writing several scenes '
+                             '(default: 1, sequential)')
+    args = parser.parse_args()
+    outputs = [o[:-len('.usda')] + '.usdc'
+               if args.binary and o.endswith('.usda') else o
+               for o in args.outputs]
+    if args.jobs > 1 and len(outputs) > 1:
+        # Scene generation is independent per file; USD itself scales well
+        # across processes, so batch fixture jobs can use every core.
+        with concurrent.futures.ProcessPoolExecutor(
+                max_workers=args.jobs, initializer=_seed_worker) as pool:
+            list(pool.map(write_usd, outputs))
+    else:
+        for output in outputs:
+            write_usd(output)